@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 
+import json
 import os
+import re
 import subprocess
-import shutil
 from datetime import datetime
 import sys
 
 FSTAB_FILE = "/etc/fstab"
 DEFAULT_MOUNT_OPTIONS = "defaults"
 DEFAULT_DUMP_PASS = "0 0"  # <dump> <pass>
+LSBLK_COLUMNS = "NAME,SIZE,FSTYPE,UUID,LABEL,MOUNTPOINT"
+
+_LSBLK_CACHE = None    # {uuid: {"name": ..., "fstype": ..., "label": ..., ...}}
+_LSBLK_DEVICES = []    # Parsed 'blockdevices' tree, kept for display
+_BLKID_CACHE = None    # {uuid: {"TYPE": ..., "LABEL": ..., ...}}
+_FSTAB_LINE = re.compile(rb"^[ \t]*([^#\s]\S*)(?:\s+(\S+))?")  # <device> [<mount point>], skips comments
 
 def check_root():
     """Check if the script is run as root."""
@@ -16,21 +23,60 @@ def check_root():
         print("🛑 This script needs to be run as root (e.g., using 'sudo python3 script_name.py').")
         sys.exit(1)
 
+def _load_lsblk():
+    """Runs lsblk once in JSON mode and caches every device keyed by UUID."""
+    global _LSBLK_CACHE, _LSBLK_DEVICES
+    _LSBLK_CACHE = {}
+    result = subprocess.run(
+        ["lsblk", "-J", "-o", LSBLK_COLUMNS],
+        capture_output=True, text=True, check=False # Check=False to handle if lsblk has issues
+    )
+    if result.returncode != 0:
+        return result
+
+    _LSBLK_DEVICES = json.loads(result.stdout).get("blockdevices", [])
+    stack = list(_LSBLK_DEVICES)
+    while stack:
+        device = stack.pop()
+        stack.extend(device.get("children") or [])
+        if device.get("uuid"):
+            _LSBLK_CACHE[device["uuid"]] = device
+    return result
+
+
+def _format_lsblk_table(devices):
+    """Renders the cached lsblk tree as a table, similar to plain 'lsblk -o ...'."""
+    columns = LSBLK_COLUMNS.lower().split(",")
+    rows = [LSBLK_COLUMNS.split(",")]
+
+    def walk(nodes, indent, top):
+        for i, device in enumerate(nodes):
+            last = i == len(nodes) - 1
+            branch = "" if top else ("└─" if last else "├─")
+            rows.append([indent + branch + str(device.get("name") or "")] + [str(device.get(c) or "") for c in columns[1:]])
+            walk(device.get("children") or [], "" if top else indent + ("  " if last else "│ "), False)
+
+    walk(devices, "", True)
+    widths = [max(len(r[i]) for r in rows) for i in range(len(columns))]
+    # lsblk right-aligns SIZE, everything else is left-aligned
+    return "\n".join(
+        " ".join(cell.rjust(w) if c == "size" else cell.ljust(w) for c, cell, w in zip(columns, r, widths)).rstrip()
+        for r in rows
+    )
+
+
 def list_drives():
     """Lists available block devices using lsblk."""
     print("\n🔍 Available block devices (partitions):")
     try:
-        result = subprocess.run(
-            ["lsblk", "-o", "NAME,SIZE,FSTYPE,UUID,LABEL,MOUNTPOINT"],
-            capture_output=True, text=True, check=False # Check=False to handle if lsblk has issues
-        )
+        result = _load_lsblk()
         if result.returncode == 0:
-            print(result.stdout)
+            print(_format_lsblk_table(_LSBLK_DEVICES))
         else:
             print(f"⚠️ lsblk command finished with error code {result.returncode}:")
             print(result.stderr)
-            print("Attempting 'sudo blkid' as an alternative to find UUIDs:")
-            alt_result = subprocess.run(["sudo", "blkid"], capture_output=True, text=True, check=False)
+            print("Attempting 'blkid' as an alternative to find UUIDs:")
+            alt_result = subprocess.run(["blkid"], capture_output=True, text=True, check=False) # Already root, no sudo needed
             print(alt_result.stdout or alt_result.stderr)
 
     except FileNotFoundError:
@@ -39,44 +85,86 @@ def list_drives():
     except Exception as e:
         print(f"An unexpected error occurred while listing drives: {e}")
 
-    print("---------------------------------------------------------------------")
-    print("Please identify the UUID of the partition you want to auto-mount.")
-    print("If the UUID is not visible, the partition might not be formatted,")
-    print("or you might need to run 'sudo blkid' manually.")
-    print("For NTFS drives (Windows), ensure 'ntfs-3g' package is installed.")
-    print("For exFAT drives, ensure 'exfat-fuse' or 'exfatprogs' is installed.")
-    print("---------------------------------------------------------------------")
+    sys.stdout.write("\n".join([
+        "---------------------------------------------------------------------",
+        "Please identify the UUID of the partition you want to auto-mount.",
+        "If the UUID is not visible, the partition might not be formatted,",
+        "or you might need to run 'sudo blkid' manually.",
+        "For NTFS drives (Windows), ensure 'ntfs-3g' package is installed.",
+        "For exFAT drives, ensure 'exfat-fuse' or 'exfatprogs' is installed.",
+        "---------------------------------------------------------------------",
+    ]) + "\n")
+
+
+def _blkid_cache():
+    """Runs blkid once for all devices and caches the export records by UUID."""
+    global _BLKID_CACHE
+    if _BLKID_CACHE is not None:
+        return _BLKID_CACHE
+    _BLKID_CACHE = {}
+    # '-c /dev/null' skips blkid's on-disk cache so results reflect the devices right now
+    try:
+        result = subprocess.run(
+            ["blkid", "-c", "/dev/null", "-o", "export"],
+            capture_output=True, text=True, check=False
+        )
+    except FileNotFoundError:
+        return _BLKID_CACHE
+    if result.returncode != 0:
+        return _BLKID_CACHE
+
+    # Records are blank-line separated KEY=value blocks, values are backslash-escaped
+    for record in result.stdout.split("\n\n"):
+        attrs = {}
+        for line in record.splitlines():
+            key, sep, value = line.partition("=")
+            if sep:
+                attrs[key] = re.sub(r"\\(.)", r"\1", value)
+        if attrs.get("UUID"):
+            _BLKID_CACHE[attrs["UUID"]] = attrs
+    return _BLKID_CACHE
 
 
 def get_fs_type_for_uuid(uuid_to_find):
-    """Tries to find the filesystem type for a given UUID using lsblk."""
+    """Finds the filesystem type for a given UUID, trying the lsblk cache first."""
     if not uuid_to_find: return None
+    cached = (_LSBLK_CACHE or {}).get(uuid_to_find, {}).get("fstype")
+    if cached:
+        return cached
     try:
+        # Cache miss: ask lsblk about just this device before a full blkid probe
         result = subprocess.run(
-            ["lsblk", "-no", "FSTYPE", f"UUID={uuid_to_find}"],
+            ["lsblk", "--nodeps", "-no", "FSTYPE", f"UUID={uuid_to_find}"],
             capture_output=True, text=True, check=False # Allow failure
         )
         if result.returncode == 0 and result.stdout.strip():
             return result.stdout.strip()
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        pass # Silently fail, user will be prompted
-    return None
-    
-def get_label_for_uuid(uuid_to_find):
-    """Tries to find the LABEL for a given UUID using blkid."""
-    if not uuid_to_find: return None
-    try:
-        result = subprocess.run(
-            ["blkid", "-U", uuid_to_find, "-o", "export"],
-            capture_output=True, text=True, check=False
-        )
-        if result.returncode == 0:
-            for line in result.stdout.splitlines():
-                if line.startswith("LABEL="):
-                    return line.split("=", 1)[1].strip('"')
-    except (FileNotFoundError):
-        pass
-    return None
+    except FileNotFoundError:
+        pass # Fall through to blkid
+    return _blkid_cache().get(uuid_to_find, {}).get("TYPE")
+
+
+def _load_fstab_index():
+    """Reads fstab once and indexes active entries by device and mount point."""
+    uuid_to_line = {}
+    mount_to_line = {}
+    with open(FSTAB_FILE, "rb") as f:
+        data = f.read()
+    for line_num, raw in enumerate(data.splitlines(), 1):
+        m = _FSTAB_LINE.match(raw)
+        if not m:
+            continue
+        device, mount_point = m.groups()
+        # Keep only the first occurrence so warnings point at the earliest line
+        uuid_to_line.setdefault(device, (line_num, raw))
+        if mount_point:
+            mount_to_line.setdefault(mount_point, (line_num, raw))
+
+    # Only the few indexed fields and lines are decoded, not the whole file
+    def decode(index):
+        return {k.decode("utf-8", "replace"): (n, line.strip().decode("utf-8", "replace"))
+                for k, (n, line) in index.items()}
+    return decode(uuid_to_line), decode(mount_to_line)
 
 
 def get_user_input():
@@ -86,30 +174,31 @@ def get_user_input():
         print("❌ UUID cannot be empty. Exiting.")
         sys.exit(1)
 
-    # Check if UUID already exists in fstab
     try:
-        with open(FSTAB_FILE, "r") as f:
-            for line_num, line_content in enumerate(f, 1):
-                line_content = line_content.strip()
-                if not line_content or line_content.startswith("#"):
-                    continue
-                parts = line_content.split()
-                if len(parts) > 0 and parts[0] == f"UUID={drive_uuid}":
-                    print(f"⚠️ Warning: An entry with UUID={drive_uuid} already exists in {FSTAB_FILE} (line {line_num}):")
-                    print(f"  {line_content}")
-                    confirm_continue = input("Do you want to continue and add another entry for this UUID? (yes/no): ").lower()
-                    if confirm_continue != "yes":
-                        print("Aborting.")
-                        sys.exit(1)
-                    break # Only warn once per UUID
+        uuid_to_line, mount_to_line = _load_fstab_index()
     except FileNotFoundError:
         print(f"❌ Error: {FSTAB_FILE} not found. This script expects a standard Linux environment.")
         sys.exit(1)
     except Exception as e:
         print(f"An error occurred while reading {FSTAB_FILE}: {e}")
         sys.exit(1)
+
+    # Check if UUID already exists in fstab
+    existing = uuid_to_line.get(f"UUID={drive_uuid}")
+    if existing:
+        line_num, line_content = existing
+        print(f"⚠️ Warning: An entry with UUID={drive_uuid} already exists in {FSTAB_FILE} (line {line_num}):")
+        print(f"  {line_content}")
+        confirm_continue = input("Do you want to continue and add another entry for this UUID? (yes/no): ").lower()
+        if confirm_continue != "yes":
+            print("Aborting.")
+            sys.exit(1)
     
-    label = get_label_for_uuid(drive_uuid)
+    device = (_LSBLK_CACHE or {}).get(drive_uuid)
+    if device is not None:
+        label = device.get("label")
+    else: # Only probe with blkid when lsblk didn't report the device
+        label = _blkid_cache().get(drive_uuid, {}).get("LABEL")
     default_mount_name = label.replace(" ", "_").lower() if label else f"drive-{drive_uuid[:8]}"
     suggested_mount_point = f"/mnt/{default_mount_name}"
     
@@ -121,26 +210,15 @@ def get_user_input():
         sys.exit(1)
 
     # Check if mount_point already exists in fstab
-    try:
-        with open(FSTAB_FILE, "r") as f:
-            for line_num, line_content in enumerate(f, 1):
-                line_content = line_content.strip()
-                if not line_content or line_content.startswith("#"):
-                    continue
-                parts = line_content.split()
-                if len(parts) > 1 and parts[1] == mount_point:
-                    print(f"⚠️ Warning: Mount point '{mount_point}' is already used in an active entry in {FSTAB_FILE} (line {line_num}):")
-                    print(f"  {line_content}")
-                    confirm_continue_mp = input("Do you want to continue and add another entry for this mount point? (yes/no): ").lower()
-                    if confirm_continue_mp != "yes":
-                        print("Aborting.")
-                        sys.exit(1)
-                    break # Only warn once per mount point
-    except FileNotFoundError: # Should not happen if previous check passed
-        pass 
-    except Exception as e:
-        print(f"An error occurred while reading {FSTAB_FILE}: {e}")
-        sys.exit(1)
+    existing = mount_to_line.get(mount_point)
+    if existing:
+        line_num, line_content = existing
+        print(f"⚠️ Warning: Mount point '{mount_point}' is already used in an active entry in {FSTAB_FILE} (line {line_num}):")
+        print(f"  {line_content}")
+        confirm_continue_mp = input("Do you want to continue and add another entry for this mount point? (yes/no): ").lower()
+        if confirm_continue_mp != "yes":
+            print("Aborting.")
+            sys.exit(1)
 
 
     detected_fstype = get_fs_type_for_uuid(drive_uuid)
@@ -165,7 +243,7 @@ def get_user_input():
 
     return drive_uuid, mount_point, fs_type, mount_options, dump_pass
 
-def create_mount_point_dir(mount_point):
+def create_mount_point_dir(mount_point, drive_uuid=None):
     """Creates the mount point directory if it doesn't exist."""
     if not os.path.isdir(mount_point):
         print(f"ℹ️ Mount point directory '{mount_point}' does not exist.")
@@ -183,8 +261,15 @@ def create_mount_point_dir(mount_point):
             print(f"⚠️ Warning: Mount point directory '{mount_point}' not created. Mounting will fail if it doesn't exist.")
             print(f"   You can create it manually later with: sudo mkdir -p \"{mount_point}\"")
     else:
+        mounted_at = (_LSBLK_CACHE or {}).get(drive_uuid, {}).get("mountpoint")
+        if mounted_at and os.path.normpath(mounted_at) == os.path.normpath(mount_point) and os.path.ismount(mount_point):
+            # This drive is already mounted here (e.g. a re-run), its contents are not hidden
+            print(f"ℹ️ This drive is already mounted at '{mount_point}'.")
+            return
         try:
-            if os.listdir(mount_point):
+            with os.scandir(mount_point) as it: # Peek at one entry instead of listing everything
+                non_empty = next(it, None) is not None
+            if non_empty:
                 print(f"⚠️ Warning: Mount point '{mount_point}' exists and is not empty.")
                 print("   Mounting here will hide its current contents.")
                 confirm_non_empty = input("Are you sure you want to continue? (yes/no): ").lower()
@@ -208,10 +293,16 @@ def add_to_fstab(drive_uuid, mount_point, fs_type, mount_options, dump_pass):
 
     confirm_add = input(f"Do you want to add this line to {FSTAB_FILE}? (yes/no): ").lower()
     if confirm_add == "yes":
-        fstab_backup = f"{FSTAB_FILE}.bak.{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        now = datetime.now() # Shared so the backup name and the fstab comment match
+        fstab_backup = f"{FSTAB_FILE}.bak.{now.strftime('%Y%m%d-%H%M%S')}"
         try:
             print(f"Backing up {FSTAB_FILE} to {fstab_backup}...")
-            shutil.copy2(FSTAB_FILE, fstab_backup) # copy2 preserves metadata
+            # A hardlink would share the inode we append to below, so copy the bytes once
+            with open(FSTAB_FILE, "rb") as src, open(fstab_backup, "xb") as dst:
+                dst.write(src.read())
+            st = os.stat(FSTAB_FILE)
+            os.chmod(fstab_backup, st.st_mode)
+            os.utime(fstab_backup, (st.st_atime, st.st_mtime))
             print(f"✅ Backup created: {fstab_backup}")
         except Exception as e:
             print(f"❌ Failed to backup {FSTAB_FILE}: {e}. Aborting.")
@@ -219,20 +310,35 @@ def add_to_fstab(drive_uuid, mount_point, fs_type, mount_options, dump_pass):
 
         try:
             print(f"Adding entry to {FSTAB_FILE}...")
-            with open(FSTAB_FILE, "r+") as f: # Read and write, start at beginning
-                content = f.read()
-                if content and not content.endswith("\n"):
-                    f.write("\n") # Ensure newline if file doesn't end with one
-                f.write(f"# Entry added by script on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(fstab_entry + "\n")
+            fd = os.open(FSTAB_FILE, os.O_RDWR | os.O_APPEND)
+            try:
+                size = os.fstat(fd).st_size
+                # Only the last byte is needed to know whether a newline must be prepended
+                needs_nl = "\n" if size and os.pread(fd, 1, size - 1) != b"\n" else ""
+                comment = f"# Entry added by script on {now.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                payload = (needs_nl + comment + fstab_entry + "\n").encode()
+                remaining = memoryview(payload)
+                try:
+                    while remaining: # os.write may accept only part of the payload
+                        written = os.write(fd, remaining)
+                        if written == 0:
+                            raise IOError(f"write stalled with {len(remaining)} of {len(payload)} bytes left")
+                        remaining = remaining[written:]
+                except OSError:
+                    os.ftruncate(fd, size) # Drop any partial entry so fstab is left as it was
+                    raise
+            finally:
+                os.close(fd)
             print(f"✅ Entry added to {FSTAB_FILE}.")
-            print("\nNext steps:")
-            print("1. Test mounting all entries: sudo mount -a")
-            print("   (If errors occur, check 'dmesg' or 'journalctl -xe' for details)")
-            print(f"2. Test this specific mount: sudo mount \"{mount_point}\"")
-            print(f"3. Verify: df -h \"{mount_point}\"")
-            print(f"If you encounter boot issues, you might need to boot into a live environment")
-            print(f"and restore from {fstab_backup} (e.g., sudo cp \"{fstab_backup}\" /mnt/system{FSTAB_FILE}).") # Corrected path
+            sys.stdout.write("\n".join([
+                "\nNext steps:",
+                "1. Test mounting all entries: sudo mount -a",
+                "   (If errors occur, check 'dmesg' or 'journalctl -xe' for details)",
+                f"2. Test this specific mount: sudo mount \"{mount_point}\"",
+                f"3. Verify: df -h \"{mount_point}\"",
+                "If you encounter boot issues, you might need to boot into a live environment",
+                f"and restore from {fstab_backup} (e.g., sudo cp \"{fstab_backup}\" /mnt/system{FSTAB_FILE}).", # Corrected path
+            ]) + "\n")
         except IOError as e:
             print(f"❌ Failed to add entry to {FSTAB_FILE}: {e}")
             print(f"   Your original fstab should be intact, but please verify. Backup is at {fstab_backup}.")
@@ -251,7 +357,7 @@ def main():
     list_drives()
     try:
         drive_uuid, mount_point, fs_type, mount_options, dump_pass = get_user_input()
-        create_mount_point_dir(mount_point)
+        create_mount_point_dir(mount_point, drive_uuid)
         add_to_fstab(drive_uuid, mount_point, fs_type, mount_options, dump_pass)
     except KeyboardInterrupt:
         print("\n🛑 Script interrupted by user. Exiting.")